@@ -1,26 +1,74 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse
-import requests
+from fastapi import FastAPI, HTTPException, Request, Body, Path
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+import httpx
+import orjson
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, Any, List
+from cachetools import TTLCache
+import redis.asyncio as aioredis
+from redis.asyncio.retry import Retry
+from redis.backoff import NoBackoff
+from typing import Dict, Any, List, Tuple, Annotated
+from pydantic import Field
 import uvicorn
-from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from io import BytesIO
-import base64
+from datetime import datetime
 import numpy as np
+from numba import njit
 import os
-from collections import defaultdict
+import time
+import re
+import hashlib
+import asyncio
+from functools import lru_cache
+from contextlib import asynccontextmanager
+from bisect import bisect_left, bisect_right
+from enum import IntEnum
 
 # Railway Configuration
-DATA_PROCESSOR_BASE_URL = os.getenv("https://web-production-e9773.up.railway.app/")
+DATA_PROCESSOR_BASE_URL = os.getenv("DATA_PROCESSOR_BASE_URL", "https://web-production-e9773.up.railway.app")
 PORT = int(os.getenv("PORT", 8001))
+REDIS_URL = os.getenv("REDIS_URL")
+# I/O-bound service: default to 2n+1 workers so upstream waits overlap across cores
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", (os.cpu_count() or 1) * 2 + 1))
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered by orjson straight to UTF-8 bytes"""
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Hold a pooled keep-alive client to the data processor for the app's lifetime"""
+    app.state.http = httpx.AsyncClient(
+        base_url=DATA_PROCESSOR_BASE_URL,
+        timeout=30.0,
+        limits=httpx.Limits(max_keepalive_connections=50, max_connections=100, keepalive_expiry=30)
+    )
+    # Optional cache shared by all workers; every waiter on a session's load waits on it,
+    # so a slow Redis must fail fast (no retries) and fall through to the data processor
+    app.state.redis = aioredis.from_url(
+        REDIS_URL,
+        socket_connect_timeout=REDIS_TIMEOUT,
+        socket_timeout=REDIS_TIMEOUT,
+        retry=Retry(NoBackoff(), 0)
+    ) if REDIS_URL else None
+    # Compile (or load the cached build of) the scoring kernel before the first request
+    _score_kernel(
+        np.zeros(1, dtype=np.float64),
+        np.zeros(1, dtype=np.int64),
+        np.zeros(1, dtype=np.int8),
+        0
+    )
+    yield
+    await app.state.http.aclose()
+    if app.state.redis is not None:
+        await app.state.redis.aclose()
 
 app = FastAPI(
     title="CIBIL Analysis Service",
     version="1.0.0",
-    description="API for analyzing CIBIL scores based on transaction data"
+    description="API for analyzing CIBIL scores based on transaction data",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 # Enable CORS
 app.add_middleware(
@@ -33,6 +81,26 @@ app.add_middleware(
 
 # In-memory storage (use Redis/Database in production)
 sessions_data: Dict[str, Any] = {}
+
+# (scored result, ETag) per session, reused for repeat requests within the TTL
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", 60))
+analysis_cache: TTLCache = TTLCache(maxsize=1024, ttl=ANALYSIS_CACHE_TTL)
+# Last good (result, ETag) per session, served when the data processor is unreachable
+ANALYSIS_STALE_TTL = int(os.getenv("ANALYSIS_STALE_TTL", 3600))
+stale_analysis_cache: TTLCache = TTLCache(maxsize=1024, ttl=ANALYSIS_STALE_TTL)
+# Shared Redis cache (when REDIS_URL is set) so all workers reuse each other's results
+REDIS_CACHE_TTL = int(os.getenv("REDIS_CACHE_TTL", 300))
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", 0.2))
+REDIS_KEY_PREFIX = "cibil:"
+# One in-flight load per session; concurrent misses await it and share its result or error
+analysis_inflight: "Dict[str, asyncio.Task]" = {}
+# Session IDs accepted by the API; anything else is rejected before reaching the data processor
+SESSION_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+SessionId = Annotated[str, Field(pattern=SESSION_ID_PATTERN)]
+# Batch endpoint: cap on sessions per call and on concurrent upstream fetches
+MAX_BATCH_SESSIONS = 200
+BATCH_CONCURRENCY = 50
+
 # Official CIBIL weightages for India (2025)
 CIBIL_FACTORS = {
     'payment_history': 0.35,      # 35% - Most critical
@@ -42,45 +110,200 @@ CIBIL_FACTORS = {
     'new_credit': 0.10            # 10% - Recent inquiries
 }
 
+# Factor score tables: bisect over ascending cut-offs selects each band
+# Payment history: payments per month (lower bounds) -> consistency score
+PAYMENT_RATE_CUTOFFS = (0.5, 1.0, 1.5)
+PAYMENT_CONSISTENCY_SCORES = (60.0, 75.0, 90.0, 95.0)
+# Credit utilization (inclusive upper bounds); score falls linearly within a band:
+# (score at band start, band start, band width, points lost across band, floor, status)
+UTILIZATION_CUTOFFS = (0.30, 0.50, 0.70)
+UTILIZATION_BANDS = (
+    (95.0, 0.0, 1.0, 0, 0, "Excellent"),
+    (85.0, 0.30, 0.20, 20, 0, "Good"),
+    (65.0, 0.50, 0.20, 20, 0, "Fair"),
+    (45, 0.70, 0.30, 15, 30, "High"),
+)
+# Credit history length in years (lower bounds): (base score, points per year, status)
+CREDIT_AGE_CUTOFFS = (1, 3, 5, 7)
+CREDIT_AGE_BANDS = (
+    (50.0, 0, "Limited"),
+    (55.0, 5, "Fair"),
+    (70.0, 0, "Good"),
+    (85.0, 0, "Very Good"),
+    (95.0, 0, "Excellent"),
+)
+# Credit mix, indexed by number of credit types (capped at 5)
+CREDIT_MIX_BANDS = (
+    (40.0, "Poor Mix"),
+    (40.0, "Poor Mix"),
+    (55.0, "Limited Mix"),
+    (70.0, "Good Mix"),
+    (85.0, "Very Good Mix"),
+    (95.0, "Excellent Mix"),
+)
+# New credit: recent inquiries (inclusive upper bounds)
+INQUIRY_CUTOFFS = (0, 2, 4)
+INQUIRY_BANDS = (
+    (90.0, "No Recent Inquiries"),
+    (80.0, "Minimal Inquiries"),
+    (65.0, "Moderate Inquiries"),
+    (50.0, "High Inquiry Activity"),
+)
+
+# Factor weights as a vector (CIBIL_FACTORS order) and the best reachable result
+CIBIL_WEIGHTS = np.array(list(CIBIL_FACTORS.values()), dtype=np.float64)
+MAX_FACTOR_SCORES = np.array([95.0, 95.0, 95.0, 95.0, 90.0])
+MAX_POSSIBLE_RAW = float((MAX_FACTOR_SCORES * CIBIL_WEIGHTS).sum())
+MAX_ACHIEVABLE_SCORE = int(300 + (MAX_POSSIBLE_RAW / 100.0) * 600)
+
+# Credit mix: one bit per credit product type
+CT_CREDIT_CARD = 1
+CT_HOME_LOAN = 2
+CT_CAR_LOAN = 4
+CT_PERSONAL_LOAN = 8
+CT_EDUCATION_LOAN = 16
+CT_LIFE_INSURANCE = 32
+CT_HEALTH_INSURANCE = 64
+CREDIT_TYPE_NAMES = (
+    (CT_CREDIT_CARD, "Credit Card"),
+    (CT_HOME_LOAN, "Home Loan"),
+    (CT_CAR_LOAN, "Car Loan"),
+    (CT_PERSONAL_LOAN, "Personal Loan"),
+    (CT_EDUCATION_LOAN, "Education Loan"),
+    (CT_LIFE_INSURANCE, "Life Insurance"),
+    (CT_HEALTH_INSURANCE, "Health Insurance"),
+)
+
+# Final score bands (lower bounds): (status, loan approval likelihood)
+SCORE_CUTOFFS = (600, 650, 700, 750, 800, 850)
+SCORE_BANDS = (
+    ("Poor", "Very Low"),
+    ("Average", "Low"),
+    ("Fair", "Moderate"),
+    ("Good", "High"),
+    ("Excellent", "Very High"),
+    ("Excellent+", "Very High"),
+    ("Exceptional (Peak)", "Maximum"),
+)
+
+# Supported date layouts: YYYY-MM-DD, YYYY/MM/DD, DD-MM-YYYY, DD/MM/YYYY, DD.MM.YYYY
+# Month and day alternatives are strptime's own %m and %d patterns
+_MONTH = r"1[0-2]|0[1-9]|[1-9]"
+_DAY = r"3[01]|[12]\d|0[1-9]|[1-9]| [1-9]"
+DATE_RE = re.compile(
+    rf"(?P<y1>\d{{4}})(?P<s1>[-/])(?P<m1>{_MONTH})(?P=s1)(?P<d1>{_DAY})"
+    rf"|(?P<d2>{_DAY})(?P<s2>[-/.])(?P<m2>{_MONTH})(?P=s2)(?P<y2>\d{{4}})"
+)
+
 def parse_transaction_date(date_str: str) -> datetime:
     """Parse transaction date from various formats"""
-    formats = ['%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d', '%d.%m.%Y']
-    for fmt in formats:
+    return _parse_date_text(str(date_str).strip())
+
+@lru_cache(maxsize=4096)
+def _parse_date_text(text: str) -> datetime:
+    """Parse a stripped date string; cached since exports repeat the same dates"""
+    # Fast path for ISO YYYY-MM-DD, the most common export format
+    if len(text) == 10 and text[4] == '-' and text[7] == '-':
         try:
-            return datetime.strptime(str(date_str).strip(), fmt)
-        except:
-            continue
-    return None
+            return datetime.fromisoformat(text)
+        except ValueError:
+            pass
+    match = DATE_RE.fullmatch(text)
+    if not match:
+        return None
+    if match['y1']:
+        year, month, day = match['y1'], match['m1'], match['d1']
+    else:
+        year, month, day = match['y2'], match['m2'], match['d2']
+    try:
+        return datetime(int(year), int(month), int(day))
+    except ValueError:
+        return None
 
-def categorize_transaction(description: str) -> str:
-    """Categorize transaction based on Indian credit products"""
-    desc_upper = description.upper()
-    
+class Category(IntEnum):
+    """Transaction categories; the values double as ids in the scoring arrays"""
+    OTHER = 0
+    CREDIT_CARD = 1
+    HOME_LOAN = 2
+    CAR_LOAN = 3
+    SECURED_LOAN = 4
+    PERSONAL_LOAN = 5
+    EDUCATION_LOAN = 6
+    LIFE_INSURANCE = 7
+    HEALTH_INSURANCE = 8
+
+# Indian credit product keywords, checked in priority order
+CATEGORY_KEYWORDS = {
     # Credit Cards
-    if any(x in desc_upper for x in ['CREDIT CARD', 'CC PAYMENT', 'CC EMI', 'CARD PAYMENT']):
-        return 'credit_card'
-    
+    Category.CREDIT_CARD: ['CREDIT CARD', 'CC PAYMENT', 'CC EMI', 'CARD PAYMENT'],
     # Secured Loans
-    if any(x in desc_upper for x in ['HOME LOAN', 'HOUSING LOAN', 'MORTGAGE', 'HL EMI']):
-        return 'home_loan'
-    if any(x in desc_upper for x in ['CAR LOAN', 'AUTO LOAN', 'VEHICLE LOAN', 'CAR EMI']):
-        return 'car_loan'
-    if any(x in desc_upper for x in ['GOLD LOAN', 'LOAN AGAINST PROPERTY']):
-        return 'secured_loan'
-    
+    Category.HOME_LOAN: ['HOME LOAN', 'HOUSING LOAN', 'MORTGAGE', 'HL EMI'],
+    Category.CAR_LOAN: ['CAR LOAN', 'AUTO LOAN', 'VEHICLE LOAN', 'CAR EMI'],
+    Category.SECURED_LOAN: ['GOLD LOAN', 'LOAN AGAINST PROPERTY'],
     # Unsecured Loans
-    if any(x in desc_upper for x in ['PERSONAL LOAN', 'PL EMI', 'CONSUMER LOAN']):
-        return 'personal_loan'
-    if any(x in desc_upper for x in ['EDUCATION LOAN', 'STUDENT LOAN']):
-        return 'education_loan'
-    
+    Category.PERSONAL_LOAN: ['PERSONAL LOAN', 'PL EMI', 'CONSUMER LOAN'],
+    Category.EDUCATION_LOAN: ['EDUCATION LOAN', 'STUDENT LOAN'],
     # Insurance (shows financial discipline)
-    if any(x in desc_upper for x in ['LIFE INSURANCE', 'LIC PREMIUM']):
-        return 'life_insurance'
-    if any(x in desc_upper for x in ['HEALTH INSURANCE', 'MEDICAL INSURANCE']):
-        return 'health_insurance'
-    
-    return 'other'
+    Category.LIFE_INSURANCE: ['LIFE INSURANCE', 'LIC PREMIUM'],
+    Category.HEALTH_INSURANCE: ['HEALTH INSURANCE', 'MEDICAL INSURANCE'],
+}
+
+# One compiled keyword alternation per category, so each check is a single C-level scan
+CATEGORY_PATTERNS = tuple(
+    (category, re.compile('|'.join(re.escape(keyword) for keyword in keywords)))
+    for category, keywords in CATEGORY_KEYWORDS.items()
+)
+
+def categorize_transaction(description: str) -> Category:
+    """Categorize transaction based on Indian credit products"""
+    desc_upper = description.upper()
+    for category, pattern in CATEGORY_PATTERNS:
+        if pattern.search(desc_upper):
+            return category
+    return Category.OTHER
+
+# Plain-int views of Category for the compiled scoring kernel
+CREDIT_CATEGORIES = (
+    Category.CREDIT_CARD,
+    Category.HOME_LOAN,
+    Category.CAR_LOAN,
+    Category.PERSONAL_LOAN,
+    Category.EDUCATION_LOAN
+)
+_CREDIT_CATEGORY_FLAGS = np.array([c in CREDIT_CATEGORIES for c in Category], dtype=np.bool_)
+_CREDIT_CARD_ID = int(Category.CREDIT_CARD)
+_NUM_CATEGORIES = len(Category)
+
+@njit(cache=True)
+def _score_kernel(amounts: np.ndarray, days: np.ndarray, cat_ids: np.ndarray, end_day: int) -> tuple:
+    """Per-transaction aggregates behind the CIBIL factors, compiled to native code.
+
+    Returns (payment_gaps, total_cc_payments, recent_inquiries) where days are
+    date ordinals and cat_ids are Category values.
+    """
+    n = days.shape[0]
+
+    # Payment history: gaps of more than 45 days between credit payments
+    payment_days = np.sort(days[_CREDIT_CATEGORY_FLAGS[cat_ids]])
+    payment_gaps = (np.diff(payment_days) > 45).sum()
+
+    # Credit utilization: total credit card outflow
+    total_cc_payments = 0.0
+    for i in range(n):
+        if cat_ids[i] == _CREDIT_CARD_ID:
+            total_cc_payments += abs(amounts[i])
+
+    # New credit: categories first seen within 180 days of the last transaction
+    first_seen = np.full(_NUM_CATEGORIES, -1, dtype=np.int64)
+    for i in range(n):
+        if first_seen[cat_ids[i]] < 0:
+            first_seen[cat_ids[i]] = days[i]
+    recent_inquiries = 0
+    for c in range(_NUM_CATEGORIES):
+        if first_seen[c] >= 0 and first_seen[c] >= end_day - 180:
+            recent_inquiries += 1
+
+    return payment_gaps, total_cc_payments, recent_inquiries
 
 def calculate_cibil_score(transactions: List[Dict]) -> Dict[str, Any]:
     """Calculate CIBIL score using official Indian methodology"""
@@ -88,42 +311,57 @@ def calculate_cibil_score(transactions: List[Dict]) -> Dict[str, Any]:
     if not transactions:
         raise ValueError("No transactions provided")
     
-    # Parse all transaction dates
-    dated_transactions = []
+    # Parse all transaction dates into parallel columns (struct-of-arrays)
+    day_values = []
+    amount_values = []
+    category_values = []
     for txn in transactions:
         date = parse_transaction_date(txn.get('date', ''))
         if date:
-            dated_transactions.append({
-                **txn,
-                'parsed_date': date,
-                'category': categorize_transaction(txn.get('description', ''))
-            })
+            category = categorize_transaction(txn.get('description', ''))
+            day_values.append(date.toordinal())
+            # Only credit card amounts are scored; other rows may carry blanks like "" or "N/A"
+            if category is Category.CREDIT_CARD:
+                amount = txn.get('amount')
+                if isinstance(amount, bool) or not isinstance(amount, (int, float)):
+                    raise ValueError(f"Invalid credit card payment amount: {amount!r}")
+                amount_values.append(amount)
+            else:
+                amount_values.append(0.0)
+            category_values.append(category)
     
-    if not dated_transactions:
+    if not day_values:
         raise ValueError("No valid transaction dates found")
     
+    num_dated = len(day_values)
+    amounts = np.array(amount_values, dtype=np.float64)
+    days = np.array(day_values, dtype=np.int64)
+    cat_ids = np.array(category_values, dtype=np.int8)
+    
     # Get actual date range from CSV
-    dates = [t['parsed_date'] for t in dated_transactions]
-    start_date = min(dates)
-    end_date = max(dates)
-    date_range_months = max(1, (end_date - start_date).days / 30)
+    start_day = int(days.min())
+    end_day = int(days.max())
+    start_date = datetime.fromordinal(start_day)
+    end_date = datetime.fromordinal(end_day)
+    date_range_months = max(1, (end_day - start_day) / 30)
     date_range_years = date_range_months / 12
     
-    # Group transactions by category
-    cc_payments = [t for t in dated_transactions if t['category'] == 'credit_card']
-    home_loans = [t for t in dated_transactions if t['category'] == 'home_loan']
-    car_loans = [t for t in dated_transactions if t['category'] == 'car_loan']
-    personal_loans = [t for t in dated_transactions if t['category'] == 'personal_loan']
-    education_loans = [t for t in dated_transactions if t['category'] == 'education_loan']
-    life_insurance = [t for t in dated_transactions if t['category'] == 'life_insurance']
-    health_insurance = [t for t in dated_transactions if t['category'] == 'health_insurance']
+    # Group transactions by category (single counting pass)
+    category_counts = np.bincount(cat_ids, minlength=_NUM_CATEGORIES).tolist()
+    num_cc_payments = category_counts[Category.CREDIT_CARD]
+    num_home_loans = category_counts[Category.HOME_LOAN]
+    num_car_loans = category_counts[Category.CAR_LOAN]
+    num_personal_loans = category_counts[Category.PERSONAL_LOAN]
+    num_education_loans = category_counts[Category.EDUCATION_LOAN]
+    num_life_insurance = category_counts[Category.LIFE_INSURANCE]
+    num_health_insurance = category_counts[Category.HEALTH_INSURANCE]
     
-    all_credit_transactions = cc_payments + home_loans + car_loans + personal_loans + education_loans
+    payment_gaps, total_cc_payments, recent_inquiries = _score_kernel(amounts, days, cat_ids, end_day)
     
     # ============================================
     # 1. PAYMENT HISTORY (35%) - Most Critical
     # ============================================
-    total_expected_payments = len(all_credit_transactions)
+    total_expected_payments = num_cc_payments + num_home_loans + num_car_loans + num_personal_loans + num_education_loans
     
     if total_expected_payments == 0:
         payment_history_score = 50.0
@@ -132,23 +370,9 @@ def calculate_cibil_score(transactions: List[Dict]) -> Dict[str, Any]:
         months_covered = date_range_months
         payments_per_month = total_expected_payments / max(1, months_covered)
         
-        if payments_per_month >= 1.5:
-            payment_consistency = 95.0
-        elif payments_per_month >= 1.0:
-            payment_consistency = 90.0
-        elif payments_per_month >= 0.5:
-            payment_consistency = 75.0
-        else:
-            payment_consistency = 60.0
+        payment_consistency = PAYMENT_CONSISTENCY_SCORES[bisect_right(PAYMENT_RATE_CUTOFFS, payments_per_month)]
         
-        payment_dates = sorted([t['parsed_date'] for t in all_credit_transactions])
-        gaps = []
-        for i in range(1, len(payment_dates)):
-            gap_days = (payment_dates[i] - payment_dates[i-1]).days
-            if gap_days > 45:
-                gaps.append(gap_days)
-        
-        gap_penalty = min(20, len(gaps) * 5)
+        gap_penalty = min(20, payment_gaps * 5)
         payment_history_score = max(50, payment_consistency - gap_penalty)
         
         payment_remarks = f"{total_expected_payments} payments tracked over {months_covered:.1f} months"
@@ -156,28 +380,17 @@ def calculate_cibil_score(transactions: List[Dict]) -> Dict[str, Any]:
     # ============================================
     # 2. CREDIT UTILIZATION RATIO (30%)
     # ============================================
-    if cc_payments:
-        total_cc_payments = sum(abs(t['amount']) for t in cc_payments)
-        num_cc_payments = len(cc_payments)
-        
+    if num_cc_payments:
         avg_payment = total_cc_payments / num_cc_payments
         estimated_monthly_bill = avg_payment * 30
         estimated_credit_limit = estimated_monthly_bill * 2.5
         
         cur = min(1.0, estimated_monthly_bill / estimated_credit_limit)
         
-        if cur <= 0.30:
-            credit_utilization_score = 95.0
-            cur_status = "Excellent"
-        elif cur <= 0.50:
-            credit_utilization_score = 85.0 - ((cur - 0.30) / 0.20) * 20
-            cur_status = "Good"
-        elif cur <= 0.70:
-            credit_utilization_score = 65.0 - ((cur - 0.50) / 0.20) * 20
-            cur_status = "Fair"
-        else:
-            credit_utilization_score = max(30, 45 - ((cur - 0.70) / 0.30) * 15)
-            cur_status = "High"
+        band_score, band_start, band_width, band_drop, floor, cur_status = (
+            UTILIZATION_BANDS[bisect_left(UTILIZATION_CUTOFFS, cur)]
+        )
+        credit_utilization_score = max(floor, band_score - ((cur - band_start) / band_width) * band_drop)
         
         cur_percentage = int(cur * 100)
     else:
@@ -190,136 +403,59 @@ def calculate_cibil_score(transactions: List[Dict]) -> Dict[str, Any]:
     # ============================================
     credit_age_years = date_range_years
     
-    if credit_age_years >= 7:
-        credit_history_score = 95.0
-        credit_age_status = "Excellent"
-    elif credit_age_years >= 5:
-        credit_history_score = 85.0
-        credit_age_status = "Very Good"
-    elif credit_age_years >= 3:
-        credit_history_score = 70.0
-        credit_age_status = "Good"
-    elif credit_age_years >= 1:
-        credit_history_score = 55.0 + (credit_age_years * 5)
-        credit_age_status = "Fair"
-    else:
-        credit_history_score = 50.0
-        credit_age_status = "Limited"
+    base_score, points_per_year, credit_age_status = CREDIT_AGE_BANDS[bisect_right(CREDIT_AGE_CUTOFFS, credit_age_years)]
+    credit_history_score = base_score + (credit_age_years * points_per_year)
     
     # ============================================
     # 4. CREDIT MIX (10%)
     # ============================================
-    credit_types_present = set()
-    
-    if cc_payments:
-        credit_types_present.add("Credit Card")
-    if home_loans:
-        credit_types_present.add("Home Loan")
-    if car_loans:
-        credit_types_present.add("Car Loan")
-    if personal_loans:
-        credit_types_present.add("Personal Loan")
-    if education_loans:
-        credit_types_present.add("Education Loan")
-    if life_insurance:
-        credit_types_present.add("Life Insurance")
-    if health_insurance:
-        credit_types_present.add("Health Insurance")
-    
-    num_credit_types = len(credit_types_present)
-    
-    if num_credit_types >= 5:
-        credit_mix_score = 95.0
-        mix_status = "Excellent Mix"
-    elif num_credit_types == 4:
-        credit_mix_score = 85.0
-        mix_status = "Very Good Mix"
-    elif num_credit_types == 3:
-        credit_mix_score = 70.0
-        mix_status = "Good Mix"
-    elif num_credit_types == 2:
-        credit_mix_score = 55.0
-        mix_status = "Limited Mix"
-    else:
-        credit_mix_score = 40.0
-        mix_status = "Poor Mix"
+    credit_types_mask = (
+        CT_CREDIT_CARD * bool(num_cc_payments)
+        | CT_HOME_LOAN * bool(num_home_loans)
+        | CT_CAR_LOAN * bool(num_car_loans)
+        | CT_PERSONAL_LOAN * bool(num_personal_loans)
+        | CT_EDUCATION_LOAN * bool(num_education_loans)
+        | CT_LIFE_INSURANCE * bool(num_life_insurance)
+        | CT_HEALTH_INSURANCE * bool(num_health_insurance)
+    )
+    
+    num_credit_types = credit_types_mask.bit_count()
+    
+    credit_mix_score, mix_status = CREDIT_MIX_BANDS[min(num_credit_types, 5)]
     
     # ============================================
     # 5. NEW CREDIT INQUIRIES (10%)
     # ============================================
-    first_appearance_dates = {}
-    for txn in dated_transactions:
-        cat = txn['category']
-        if cat not in first_appearance_dates:
-            first_appearance_dates[cat] = txn['parsed_date']
-    
-    recent_threshold = end_date - timedelta(days=180)
-    recent_inquiries = sum(1 for date in first_appearance_dates.values() if date >= recent_threshold)
-    
-    if recent_inquiries == 0:
-        new_credit_score = 90.0
-        inquiry_status = "No Recent Inquiries"
-    elif recent_inquiries <= 2:
-        new_credit_score = 80.0
-        inquiry_status = "Minimal Inquiries"
-    elif recent_inquiries <= 4:
-        new_credit_score = 65.0
-        inquiry_status = "Moderate Inquiries"
-    else:
-        new_credit_score = 50.0
-        inquiry_status = "High Inquiry Activity"
+    new_credit_score, inquiry_status = INQUIRY_BANDS[bisect_left(INQUIRY_CUTOFFS, recent_inquiries)]
     
     # ============================================
     # FINAL CIBIL SCORE CALCULATION
     # ============================================
-    raw_score = (
-        payment_history_score * CIBIL_FACTORS['payment_history'] +
-        credit_utilization_score * CIBIL_FACTORS['credit_utilization'] +
-        credit_history_score * CIBIL_FACTORS['credit_history_length'] +
-        credit_mix_score * CIBIL_FACTORS['credit_mix'] +
-        new_credit_score * CIBIL_FACTORS['new_credit']
-    )
+    factor_scores = np.array([
+        payment_history_score,
+        credit_utilization_score,
+        credit_history_score,
+        credit_mix_score,
+        new_credit_score
+    ])
+    # Weighted contribution of each factor, in CIBIL_FACTORS order
+    contributions = (factor_scores * CIBIL_WEIGHTS).tolist()
+    raw_score = sum(contributions)
     
     final_cibil_score = int(300 + (raw_score / 100.0) * 600)
     
-    max_possible_raw = (
-        95.0 * CIBIL_FACTORS['payment_history'] +
-        95.0 * CIBIL_FACTORS['credit_utilization'] +
-        95.0 * CIBIL_FACTORS['credit_history_length'] +
-        95.0 * CIBIL_FACTORS['credit_mix'] +
-        90.0 * CIBIL_FACTORS['new_credit']
-    )
-    max_achievable_score = int(300 + (max_possible_raw / 100.0) * 600)
+    score_percentage = (raw_score / MAX_POSSIBLE_RAW) * 100
     
-    score_percentage = (raw_score / max_possible_raw) * 100
+    status, loan_approval = SCORE_BANDS[bisect_right(SCORE_CUTOFFS, final_cibil_score)]
     
-    is_peak = False
+    is_peak = final_cibil_score >= 850
     peak_message = None
     
-    if final_cibil_score >= 850:
-        status = "Exceptional (Peak)"
-        loan_approval = "Maximum"
-        is_peak = True
-        peak_message = "⭐ You've reached peak CIBIL performance! Score above 850 is exceptional."
-    elif final_cibil_score >= 800:
-        status = "Excellent+"
-        loan_approval = "Very High"
-        peak_message = f"Outstanding! You're {850 - final_cibil_score} points away from peak performance."
-    elif final_cibil_score >= 750:
-        status = "Excellent"
-        loan_approval = "Very High"
-    elif final_cibil_score >= 700:
-        status = "Good"
-        loan_approval = "High"
-    elif final_cibil_score >= 650:
-        status = "Fair"
-        loan_approval = "Moderate"
-    elif final_cibil_score >= 600:
-        status = "Average"
-        loan_approval = "Low"
-    else:
-        status = "Poor"
-        loan_approval = "Very Low"
+    if final_cibil_score >= 800:
+        peak_message = (
+            "⭐ You've reached peak CIBIL performance! Score above 850 is exceptional." if is_peak
+            else f"Outstanding! You're {850 - final_cibil_score} points away from peak performance."
+        )
     
     recommendations = []
     if payment_history_score < 80:
@@ -349,47 +485,47 @@ def calculate_cibil_score(transactions: List[Dict]) -> Dict[str, Any]:
             "payment_history": {
                 "score": round(payment_history_score, 1),
                 "weightage": "35%",
-                "contribution": round(payment_history_score * CIBIL_FACTORS['payment_history'], 1),
+                "contribution": round(contributions[0], 1),
                 "remarks": payment_remarks
             },
             "credit_utilization": {
                 "score": round(credit_utilization_score, 1),
                 "weightage": "30%",
-                "contribution": round(credit_utilization_score * CIBIL_FACTORS['credit_utilization'], 1),
+                "contribution": round(contributions[1], 1),
                 "utilization_percentage": cur_percentage,
                 "status": cur_status
             },
             "credit_history_length": {
                 "score": round(credit_history_score, 1),
                 "weightage": "15%",
-                "contribution": round(credit_history_score * CIBIL_FACTORS['credit_history_length'], 1),
+                "contribution": round(contributions[2], 1),
                 "years": round(credit_age_years, 2),
                 "status": credit_age_status
             },
             "credit_mix": {
                 "score": round(credit_mix_score, 1),
                 "weightage": "10%",
-                "contribution": round(credit_mix_score * CIBIL_FACTORS['credit_mix'], 1),
+                "contribution": round(contributions[3], 1),
                 "types_count": num_credit_types,
-                "types": list(credit_types_present),
+                "types": [name for bit, name in CREDIT_TYPE_NAMES if credit_types_mask & bit],
                 "status": mix_status
             },
             "new_credit": {
                 "score": round(new_credit_score, 1),
                 "weightage": "10%",
-                "contribution": round(new_credit_score * CIBIL_FACTORS['new_credit'], 1),
+                "contribution": round(contributions[4], 1),
                 "recent_inquiries": recent_inquiries,
                 "status": inquiry_status
             }
         },
         "transaction_summary": {
-            "total_transactions": len(dated_transactions),
-            "credit_card_payments": len(cc_payments),
-            "home_loan_payments": len(home_loans),
-            "car_loan_payments": len(car_loans),
-            "personal_loan_payments": len(personal_loans),
-            "education_loan_payments": len(education_loans),
-            "insurance_payments": len(life_insurance) + len(health_insurance)
+            "total_transactions": num_dated,
+            "credit_card_payments": num_cc_payments,
+            "home_loan_payments": num_home_loans,
+            "car_loan_payments": num_car_loans,
+            "personal_loan_payments": num_personal_loans,
+            "education_loan_payments": num_education_loans,
+            "insurance_payments": num_life_insurance + num_health_insurance
         },
         "recommendations": recommendations
     }
@@ -398,10 +534,8 @@ def calculate_cibil_score(transactions: List[Dict]) -> Dict[str, Any]:
 # API ENDPOINTS
 # ============================================
 
-@app.get("/", response_class=HTMLResponse)
-async def root():
-    """Root endpoint with API documentation"""
-    html_content = """
+# Static landing page, encoded once at import
+ROOT_HTML = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -490,6 +624,15 @@ async def root():
                 </div>
             </div>
             
+            <div class="endpoint">
+                <span class="method">POST</span>
+                <code>/analyze-cibil:batch</code>
+                <p>Analyze up to 200 sessions in one call; results are keyed by session ID, with per-session errors</p>
+                <div class="example">
+                    <strong>Example body:</strong> <code>["abc123", "def456"]</code>
+                </div>
+            </div>
+            
             <div class="endpoint">
                 <span class="method">GET</span>
                 <code>/docs</code>
@@ -507,73 +650,225 @@ async def root():
         </div>
     </body>
     </html>
-    """
-    return HTMLResponse(content=html_content)
+    """.encode("utf-8")
+ROOT_HEADERS = {"Cache-Control": "public, max-age=3600"}
+
+# Health payload never changes for the life of the process
+HEALTH_BODY = orjson.dumps({
+    "status": "healthy",
+    "service": "CIBIL Analysis",
+    "version": "1.0.0",
+    "data_processor_url": DATA_PROCESSOR_BASE_URL
+})
+
+@app.get("/", response_class=HTMLResponse)
+async def root():
+    """Root endpoint with API documentation"""
+    return HTMLResponse(content=ROOT_HTML, headers=ROOT_HEADERS)
 
 @app.get("/health")
 async def health():
     """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "service": "CIBIL Analysis",
-        "version": "1.0.0",
-        "data_processor_url": DATA_PROCESSOR_BASE_URL
-    }
+    return Response(content=HEALTH_BODY, media_type="application/json")
 
-@app.get("/analyze-cibil/{session_id}")
-async def analyze_cibil_score(session_id: str):
-    """Analyze CIBIL score based on actual CSV transaction data"""
+def analysis_etag(session_id: str, body: bytes) -> str:
+    """Weak validator for a serialized analysis; responses differ only in their timestamp"""
+    return 'W/"' + hashlib.sha1(session_id.encode() + body).hexdigest() + '"'
+
+async def read_shared_analysis(redis: aioredis.Redis, session_id: str) -> bytes:
+    """Load a serialized result from Redis; None on a miss or when Redis is unavailable"""
+    if redis is None:
+        return None
     try:
-        url = f"{DATA_PROCESSOR_BASE_URL}/cibil-data/{session_id}"
-        response = requests.get(url, timeout=30)
-        
-        if response.status_code == 404:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Session '{session_id}' not found. Please ensure data processor has this session."
-            )
-        elif response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Failed to fetch data from processor: {response.text}"
-            )
-        
-        data = response.json()
-        transactions = data.get('relevant_transactions', [])
-        
-        if not transactions:
-            raise HTTPException(
-                status_code=400,
-                detail="No transactions found in CSV for this session"
-            )
-        
-        result = calculate_cibil_score(transactions)
-        
-        # Add metadata
-        result["session_id"] = session_id
-        result["timestamp"] = datetime.now().isoformat()
-        result["methodology"] = "TransUnion CIBIL India 2025"
-        
-        return result
-        
-    except requests.exceptions.ConnectionError:
+        return await redis.get(REDIS_KEY_PREFIX + session_id)
+    except aioredis.RedisError:
+        return None
+
+async def write_shared_analysis(redis: aioredis.Redis, session_id: str, body: bytes):
+    """Store a serialized result in Redis, ignoring Redis outages"""
+    if redis is None:
+        return
+    try:
+        await redis.set(REDIS_KEY_PREFIX + session_id, body, ex=REDIS_CACHE_TTL)
+    except aioredis.RedisError:
+        pass
+
+async def get_cibil_analysis(
+    client: httpx.AsyncClient,
+    session_id: str,
+    redis: aioredis.Redis = None
+) -> Tuple[Dict[str, Any], str]:
+    """Fetch and score a session's transactions, reusing a cached (result, ETag) within the TTL"""
+    cached = analysis_cache.get(session_id)
+    if cached is not None:
+        return cached
+    
+    task = analysis_inflight.get(session_id)
+    if task is None:
+        task = asyncio.ensure_future(load_cibil_analysis(client, session_id, redis))
+        analysis_inflight[session_id] = task
+        task.add_done_callback(lambda done: finish_inflight_analysis(session_id, done))
+    # Shield so a disconnecting client doesn't cancel the load other requests are waiting on
+    return await asyncio.shield(task)
+
+def finish_inflight_analysis(session_id: str, task: asyncio.Task):
+    """Drop a finished load so the next miss starts a fresh one"""
+    if analysis_inflight.get(session_id) is task:
+        del analysis_inflight[session_id]
+    # Mark the error as retrieved even if every waiter went away
+    if not task.cancelled():
+        task.exception()
+
+async def load_cibil_analysis(
+    client: httpx.AsyncClient,
+    session_id: str,
+    redis: aioredis.Redis = None
+) -> Tuple[Dict[str, Any], str]:
+    """Load a session's (result, ETag) from Redis or the data processor and cache it"""
+    body = await read_shared_analysis(redis, session_id)
+    if body is not None:
+        cached = (orjson.loads(body), analysis_etag(session_id, body))
+        analysis_cache[session_id] = cached
+        stale_analysis_cache[session_id] = cached
+        return cached
+    
+    try:
+        response = await client.get(f"/cibil-data/{session_id}")
+    except (httpx.ConnectError, httpx.TimeoutException):
+        stale = stale_analysis_cache.get(session_id)
+        if stale is not None:
+            # Serve the stale copy for a full TTL instead of retrying the outage on every request
+            analysis_cache[session_id] = stale
+            return stale
+        raise
+    
+    if response.status_code == 404:
         raise HTTPException(
+            status_code=404,
+            detail=f"Session '{session_id}' not found. Please ensure data processor has this session."
+        )
+    elif response.status_code != 200:
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"Failed to fetch data from processor: {response.text}"
+        )
+    
+    try:
+        data = orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=502, detail="Invalid JSON received from data processor")
+    transactions = data.get('relevant_transactions', [])
+    
+    if not transactions:
+        raise HTTPException(
+            status_code=400,
+            detail="No transactions found in CSV for this session"
+        )
+    
+    # Scoring is CPU-bound, so run it off the event loop
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, calculate_cibil_score, transactions)
+    # Serialize once: the same bytes feed the ETag and the shared cache
+    body = orjson.dumps(result)
+    cached = (result, analysis_etag(session_id, body))
+    analysis_cache[session_id] = cached
+    stale_analysis_cache[session_id] = cached
+    await write_shared_analysis(redis, session_id, body)
+    return cached
+
+# (epoch second, formatted timestamp) so the clock string is built at most once per second
+_timestamp_cache = [0, ""]
+
+def current_timestamp() -> str:
+    """Local ISO-8601 timestamp at one-second precision, cached per second"""
+    now = int(time.time())
+    if now != _timestamp_cache[0]:
+        _timestamp_cache[0] = now
+        _timestamp_cache[1] = datetime.fromtimestamp(now).isoformat()
+    return _timestamp_cache[1]
+
+def build_analysis_response(session_id: str, analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a cached analysis and add the per-request metadata"""
+    # Copy so per-request metadata never leaks into the cached result
+    result = dict(analysis)
+    result["session_id"] = session_id
+    result["timestamp"] = current_timestamp()
+    result["methodology"] = "TransUnion CIBIL India 2025"
+    return result
+
+def analysis_error(exc: Exception) -> HTTPException:
+    """Map a failure from get_cibil_analysis to the HTTP error reported to clients"""
+    if isinstance(exc, HTTPException):
+        return exc
+    if isinstance(exc, httpx.ConnectError):
+        return HTTPException(
             status_code=503,
             detail=f"Cannot connect to data processor at {DATA_PROCESSOR_BASE_URL}"
         )
-    except requests.exceptions.Timeout:
-        raise HTTPException(status_code=504, detail="Request timeout - data processor not responding")
-    except ValueError as ve:
-        raise HTTPException(status_code=400, detail=str(ve))
-    except HTTPException:
-        raise
+    if isinstance(exc, httpx.TimeoutException):
+        return HTTPException(status_code=504, detail="Request timeout - data processor not responding")
+    if isinstance(exc, ValueError):
+        return HTTPException(status_code=400, detail=str(exc))
+    return HTTPException(status_code=500, detail=f"Internal server error: {str(exc)}")
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak If-None-Match comparison (RFC 9110): W/ prefixes are ignored on both sides"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+@app.get("/analyze-cibil/{session_id}", response_class=ORJSONResponse)
+async def analyze_cibil_score(request: Request, session_id: str = Path(..., pattern=SESSION_ID_PATTERN)):
+    """Analyze CIBIL score based on actual CSV transaction data"""
+    try:
+        analysis, etag = await get_cibil_analysis(request.app.state.http, session_id, request.app.state.redis)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+        raise analysis_error(e)
+    
+    cache_headers = {"ETag": etag, "Cache-Control": f"public, max-age={ANALYSIS_CACHE_TTL}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers)
+    
+    # Result holds only JSON-native types, so skip FastAPI's jsonable_encoder pass
+    return ORJSONResponse(build_analysis_response(session_id, analysis), headers=cache_headers)
+
+@app.post("/analyze-cibil:batch", response_class=ORJSONResponse)
+async def analyze_cibil_batch(request: Request, session_ids: List[SessionId] = Body(..., max_length=MAX_BATCH_SESSIONS)):
+    """Analyze several sessions concurrently; failures are reported per session"""
+    client = request.app.state.http
+    redis = request.app.state.redis
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def analyze_one(session_id: str):
+        async with semaphore:
+            try:
+                analysis, _ = await get_cibil_analysis(client, session_id, redis)
+            except Exception as e:
+                error = analysis_error(e)
+                return session_id, {"error": error.detail, "status_code": error.status_code}
+        return session_id, build_analysis_response(session_id, analysis)
+    
+    # Duplicate IDs are fetched once; each session still goes through the shared caches and locks
+    results = await asyncio.gather(*(analyze_one(sid) for sid in dict.fromkeys(session_ids)))
+    return ORJSONResponse(dict(results))
 
 if __name__ == "__main__":
     print(f"Starting CIBIL Analysis Service on port {PORT}")
     print(f"Data Processor URL: {DATA_PROCESSOR_BASE_URL}")
-    uvicorn.run(app, host="0.0.0.0", port=PORT)
+    print(f"Workers: {WEB_CONCURRENCY}")
+    # Production equivalent: gunicorn -k uvicorn.workers.UvicornWorker -w $WEB_CONCURRENCY main:app
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=PORT,
+        loop="uvloop",
+        http="httptools",
+        workers=WEB_CONCURRENCY,
+        log_level="warning"
+    )
 
 
 
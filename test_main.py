@@ -0,0 +1,159 @@
+import asyncio
+import random
+import time
+from datetime import datetime
+
+import httpx
+import pytest
+
+import main
+from main import calculate_cibil_score, etag_matches, get_cibil_analysis, parse_transaction_date
+
+DATE_FORMATS = ['%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d', '%d.%m.%Y']
+# Includes non-ASCII digits, which strptime accepts only in some positions
+FUZZ_ALPHABET = "0123456789\u0661\u0662\uff14\uff15-/. x"
+
+TRANSACTIONS = [
+    {'date': '2024-01-05', 'description': 'CREDIT CARD PAYMENT', 'amount': -5000},
+    {'date': '2024-02-05', 'description': 'CREDIT CARD PAYMENT', 'amount': -4500},
+    {'date': '05-03-2024', 'description': 'HOME LOAN EMI', 'amount': -20000},
+    {'date': '2024/04/05', 'description': 'GROCERY', 'amount': -1200},
+]
+
+def test_blank_amount_on_non_card_row_is_ignored():
+    blank = [dict(t) for t in TRANSACTIONS]
+    blank[2]['amount'] = ""
+    blank[3]['amount'] = "N/A"
+    assert calculate_cibil_score(blank) == calculate_cibil_score(TRANSACTIONS)
+
+@pytest.mark.parametrize("amount", [None, "", "N/A", "-5000", "missing"])
+def test_non_numeric_card_amount_is_rejected(amount):
+    rows = [dict(t) for t in TRANSACTIONS]
+    if amount == "missing":
+        del rows[0]['amount']
+    else:
+        rows[0]['amount'] = amount
+    with pytest.raises(ValueError):
+        calculate_cibil_score(rows)
+
+def strptime_date(date_str):
+    """The original strptime chain that parse_transaction_date replaces"""
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(date_str).strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+def fuzzed_dates(count, seed=1):
+    """Valid dates in every layout with a few random edits, plus random strings"""
+    rnd = random.Random(seed)
+    for i in range(count):
+        if i % 2:
+            yield ''.join(rnd.choice(FUZZ_ALPHABET) for _ in range(rnd.randint(0, 12)))
+            continue
+        date = datetime(rnd.randint(1, 9999), rnd.randint(1, 12), rnd.randint(1, 28))
+        chars = list(date.strftime(rnd.choice(DATE_FORMATS)))
+        for _ in range(rnd.randint(0, 2)):
+            pos = rnd.randrange(len(chars) + 1)
+            op = rnd.random()
+            if op < 0.4:
+                chars.insert(pos, rnd.choice(FUZZ_ALPHABET))
+            elif pos < len(chars):
+                if op < 0.7:
+                    chars[pos] = rnd.choice(FUZZ_ALPHABET)
+                else:
+                    del chars[pos]
+        yield ''.join(chars)
+
+def test_parse_transaction_date_matches_strptime():
+    edge_cases = ['2024-01- 5', '1999/12/ 5', ' 05.03.2024 ', '5-3-2024', '2024-02-30', '00-01-2024',
+                  '2024-1-05', '2024-01-05x', '', None, 20240105, '2024-01-05T00:00',
+                  '\u0661147-7-2\u0662', '\uff11\uff12-01-2024']
+    for text in edge_cases + list(fuzzed_dates(50000)):
+        assert parse_transaction_date(text) == strptime_date(text), repr(text)
+
+def test_unhashable_date_is_skipped():
+    rows = TRANSACTIONS + [{'date': ['2024', '05', '01'], 'description': 'GROCERY', 'amount': -10}]
+    assert calculate_cibil_score(rows) == calculate_cibil_score(TRANSACTIONS)
+
+@pytest.mark.parametrize("failure", ["timeout", "not_found"])
+def test_concurrent_misses_share_one_failing_fetch(failure):
+    calls = []
+    
+    async def handler(request):
+        calls.append(request.url.path)
+        await asyncio.sleep(0.2)
+        if failure == "timeout":
+            raise httpx.ReadTimeout("data processor timed out", request=request)
+        return httpx.Response(404)
+    
+    async def run():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport, base_url="http://upstream") as client:
+            start = time.perf_counter()
+            misses = (get_cibil_analysis(client, f"coalesce-{failure}") for _ in range(10))
+            results = await asyncio.gather(*misses, return_exceptions=True)
+            return results, time.perf_counter() - start
+    
+    results, elapsed = asyncio.run(run())
+    assert len(calls) == 1
+    expected = httpx.ReadTimeout if failure == "timeout" else main.HTTPException
+    assert all(isinstance(result, expected) for result in results)
+    assert elapsed < 0.4
+    assert f"coalesce-{failure}" not in main.analysis_inflight
+
+class MemoryRedis:
+    """In-process stand-in for the shared Redis cache"""
+    def __init__(self):
+        self.data = {}
+    
+    async def get(self, key):
+        return self.data.get(key)
+    
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+def test_outage_serves_stale_copy_from_redis_without_retrying():
+    calls = []
+    
+    def upstream_up(request):
+        calls.append(request.url.path)
+        return httpx.Response(200, json={'relevant_transactions': TRANSACTIONS})
+    
+    def upstream_down(request):
+        calls.append(request.url.path)
+        raise httpx.ConnectError("data processor down", request=request)
+    
+    async def analyze(handler, redis, count=1):
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport, base_url="http://upstream") as client:
+            return await asyncio.gather(*(get_cibil_analysis(client, "stale-1", redis) for _ in range(count)))
+    
+    redis = MemoryRedis()
+    # Another worker scores the session and shares it through Redis
+    computed, = asyncio.run(analyze(upstream_up, redis))
+    main.analysis_cache.clear()
+    main.stale_analysis_cache.clear()
+    # This worker only ever sees the session through Redis
+    assert asyncio.run(analyze(upstream_down, redis)) == [computed]
+    
+    # Redis entry and local copy expire, then the data processor goes down
+    redis.data.clear()
+    main.analysis_cache.clear()
+    calls.clear()
+    assert asyncio.run(analyze(upstream_down, redis, count=10)) == [computed] * 10
+    assert asyncio.run(analyze(upstream_down, redis, count=10)) == [computed] * 10
+    assert len(calls) == 1
+
+@pytest.mark.parametrize("header, matches", [
+    ('W/"abc"', True),
+    ('"abc"', True),
+    ('"x", W/"abc"', True),
+    ('*', True),
+    ('"abcd"', False),
+    ('', False),
+    (None, False),
+])
+def test_if_none_match_uses_weak_comparison(header, matches):
+    assert etag_matches(header, 'W/"abc"') is matches